@@ -1,12 +1,111 @@
 import streamlit as st
 import os
+import io
 import tempfile
 import subprocess
-from docker_builder import DockerBuilder
-from dependency_analyzer import DependencyAnalyzer
+import hashlib
+import time
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+
+# Uploads are copied to disk in chunks of this size, by this many writer threads
+CHUNK_SIZE = 1 << 20
+UPLOAD_WRITERS = 4
+
+@st.cache_data(show_spinner=False)
+def analyze_dependencies(file_hash: str, file_ext: str, _content: memoryview, _file_path: str):
+    """Analyze an uploaded file, cached by the SHA-256 of its contents"""
+    # Shares the process-wide cache with DockerBuilder, so the build reuses this result
+    from dependency_cache import analyze_cached
+    return analyze_cached(_file_path, _content)
+
+def save_upload(uploaded_file, suffix: str):
+    """Write an upload to a temp file with parallel positional writes, returning (path, sha256)"""
+    with uploaded_file.getbuffer() as data, tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        if not hasattr(os, 'pwrite'):
+            tmp_file.write(data)
+            return tmp_file.name, hashlib.sha256(data).hexdigest()
+
+        fd = tmp_file.fileno()
+        if data.nbytes and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(fd, 0, data.nbytes)
+            except OSError:
+                pass
+
+        def write_chunk(offset: int) -> None:
+            chunk = data[offset:offset + CHUNK_SIZE]
+            while chunk:
+                written = os.pwrite(fd, chunk, offset)
+                chunk = chunk[written:]
+                offset += written
+
+        # Hash on this thread while the writers fill in the file
+        with ThreadPoolExecutor(max_workers=UPLOAD_WRITERS) as executor:
+            writes = [executor.submit(write_chunk, offset) for offset in range(0, data.nbytes, CHUNK_SIZE)]
+            digest = hashlib.sha256(data).hexdigest()
+            for write in writes:
+                write.result()
+        return tmp_file.name, digest
+
+class PipeReader(io.RawIOBase):
+    """Forward-only reader over a pipe, read in CHUNK_SIZE pieces and hashed as it passes"""
+
+    def __init__(self, pipe):
+        self._pipe = pipe
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # download_button rewinds its data before reading; a fresh pipe is already at the start
+        if offset != 0 or whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("PipeReader can only seek to the start")
+        return 0
+
+    def readinto(self, buffer) -> int:
+        count = self._pipe.readinto(buffer)
+        with memoryview(buffer) as view:
+            self._consumed(view[:count])
+        return count
+
+    def readall(self) -> bytearray:
+        # Read straight into one growing buffer, so the image is never held twice by a join
+        data = bytearray()
+        while True:
+            start = len(data)
+            data.extend(bytes(CHUNK_SIZE))
+            with memoryview(data)[start:] as view:
+                count = self.readinto(view)
+            del data[start + count:]
+            if not count:
+                return data
+
+    def _consumed(self, chunk) -> None:
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+
+@st.cache_resource
+def get_build_executor() -> ThreadPoolExecutor:
+    """Shared pool that Docker builds run on, outside the script thread"""
+    return ThreadPoolExecutor(max_workers=2)
+
+def build_image(file_path: str) -> Optional[str]:
+    """Build a Docker image for file_path, removing the file afterwards"""
+    from docker_builder import DockerBuilder
+    try:
+        with DockerBuilder(file_path) as builder:
+            return builder.build()
+    finally:
+        os.unlink(file_path)
 
 st.title("AirSeal - Automated Dependency Analysis and Docker Image Builder")
 
+# Build futures by source SHA-256, so an unchanged file is never rebuilt
+builds = st.session_state.setdefault('builds', {})
+
 uploaded_file = st.file_uploader("Choose a file", type=['py', 'java', 'js', 'cpp', 'go', 'rs'])
 
 if uploaded_file is not None:
@@ -19,56 +118,70 @@ if uploaded_file is not None:
     st.write(file_details)
     
     if st.button('Build Docker Image'):
-        with st.spinner('Building Docker image...'):
-            try:
-                # Save uploaded file temporarily
-                with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
-                    content = uploaded_file.read()
-                    tmp_file.write(content)
-                    tmp_path = tmp_file.name
-
-                # Analyze dependencies first
-                analyzer = DependencyAnalyzer()
-                dependencies = analyzer.analyze(tmp_path)
-                
-                # Show dependencies
-                st.subheader("Dependencies Found:")
-                for dep in dependencies:
-                    st.write(f"- {dep.type}: {dep.name} {dep.version if dep.version else ''}")
-
-                # Build Docker image
-                builder = DockerBuilder(tmp_path)
-                image_name = builder.build()
-                
-                if image_name:
-                    # Save the Docker image as an img file
-                    img_path = os.path.join(tempfile.gettempdir(), f"{image_name.replace(':', '_')}.img")
-                    subprocess.run(['docker', 'save', image_name], stdout=open(img_path, 'wb'), check=True)
-                    
-                    # Provide download button
-                    with open(img_path, 'rb') as f:
-                        st.success(f"Docker image built successfully!")
-                        st.download_button(
-                            label="Download Docker Image",
-                            data=f,
-                            file_name=f"{image_name.replace(':', '_')}.img",
-                            mime="application/octet-stream"
-                        )
-                        
-                    # Show docker run command
-                    st.code(f"# After downloading, load the image with:\ndocker load < {image_name.replace(':', '_')}.img\n\n# Then run it with:\ndocker run {image_name}")
-                    
-                    # Cleanup img file
-                    os.unlink(img_path)
-                else:
-                    st.error("Failed to build Docker image")
-                    
-                # Cleanup
-                builder.cleanup()
+        try:
+            # Save uploaded file temporarily, hashing it on the way
+            file_ext = f".{uploaded_file.name.split('.')[-1]}"
+            tmp_path, file_hash = save_upload(uploaded_file, file_ext)
+
+            # Analyze dependencies first, reading the in-memory upload without copying it
+            with uploaded_file.getbuffer() as content:
+                st.session_state.dependencies = analyze_dependencies(file_hash, file_ext, content, tmp_path)
+
+            # Build in the background, at most once per source file
+            if file_hash in builds:
                 os.unlink(tmp_path)
+            else:
+                builds[file_hash] = get_build_executor().submit(build_image, tmp_path)
+            st.session_state.pending_build = file_hash
+
+        except (OSError, ValueError) as e:
+            st.error(f"Error: {str(e)}")
+
+    if st.session_state.get('pending_build'):
+        # Show dependencies
+        st.subheader("Dependencies Found:")
+        st.markdown("\n".join(
+            f"- {dep.type}: {dep.name} {dep.version if dep.version else ''}"
+            for dep in st.session_state.dependencies
+        ))
+
+        file_hash = st.session_state.pending_build
+        future = builds[file_hash]
+        if not future.done():
+            with st.spinner('Building Docker image...' if future.running() else 'Waiting for a free build slot...'):
+                time.sleep(1)
+            st.rerun()
+        del st.session_state.pending_build
+
+        try:
+            image_name = future.result()
+            
+            if image_name:
+                # Stream the saved image straight into the download button
+                proc = subprocess.Popen(['docker', 'save', image_name], stdout=subprocess.PIPE, bufsize=CHUNK_SIZE)
+                with proc.stdout:
+                    image = PipeReader(proc.stdout)
+                    st.success(f"Docker image built successfully!")
+                    st.download_button(
+                        label="Download Docker Image",
+                        data=image,
+                        file_name=f"{image_name.replace(':', '_')}.img",
+                        mime="application/octet-stream"
+                    )
+                if proc.wait() != 0:
+                    raise subprocess.CalledProcessError(proc.returncode, proc.args)
+                st.caption(f"Size: {image.size / (1024 * 1024):.2f} MB, SHA-256: {image.sha256.hexdigest()}")
                     
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
+                # Show docker run command
+                st.code(f"# After downloading, verify and load the image with:\nsha256sum {image_name.replace(':', '_')}.img\ndocker load < {image_name.replace(':', '_')}.img\n\n# Then run it with:\ndocker run {image_name}")
+            else:
+                st.error("Failed to build Docker image")
+                del builds[file_hash]
+                
+        except (subprocess.CalledProcessError, OSError) as e:
+            st.error(f"Error: {str(e)}")
+            # Let the next click retry instead of replaying this failure
+            builds.pop(file_hash, None)
 
 st.markdown("""
 ### Supported Languages:
@@ -1,16 +1,27 @@
 from h2o_wave import main, app, Q, ui
 import os
+import asyncio
 import tempfile
 import base64
+import hashlib
 import json
-from dependency_analyzer import analyze_dependencies
-from docker_builder import DockerImageBuilder
+
+# Base64 text is decoded in blocks of this many characters (a multiple of 4)
+B64_BLOCK_SIZE = 1 << 20
+
+def write_base64(payload: str, fp) -> None:
+    """Decode a base64 payload into fp one block at a time."""
+    for start in range(0, len(payload), B64_BLOCK_SIZE):
+        fp.write(base64.b64decode(payload[start:start + B64_BLOCK_SIZE]))
 
 async def init(q: Q):
     """Initialize the app state."""
     q.client.initialized = False
     q.client.temp_file_path = None
     q.client.dependencies = None
+    q.client.deps_json = None
+    q.client.file_hash = None
+    q.client.image_name = None
     q.client.error = None
 
 async def render_page(q: Q):
@@ -40,11 +51,11 @@ async def render_page(q: Q):
             items=[
                 ui.text_xl('Dependency Analysis'),
                 ui.text('### Direct Imports'),
-                ui.text(f'{json.dumps(q.client.dependencies.get("direct_imports", {}), indent=2)}'),
+                ui.text(q.client.deps_json["direct_imports"]),
                 ui.text('### Package Requirements'),
-                ui.text(f'{json.dumps(q.client.dependencies.get("package_requirements", {}), indent=2)}'),
+                ui.text(q.client.deps_json["package_requirements"]),
                 ui.text('### Installed Versions'),
-                ui.text(f'{json.dumps(q.client.dependencies.get("installed_versions", {}), indent=2)}'),
+                ui.text(q.client.deps_json["installed_versions"]),
                 ui.button(name='generate_docker_image', label='Generate Docker Image', primary=True),
             ]
         )
@@ -65,11 +76,11 @@ async def render_page(q: Q):
                     download=True
                 ),
                 ui.text('### How to use the Docker image:'),
-                ui.text('''1. Download the .img file
+                ui.text(f'''1. Download the .img file
 2. Load the image into Docker:
-   docker load -i airseal_image.img
+   docker load -i {os.path.basename(q.client.docker_download_url)}
 3. Run the container:
-   docker run airseal-app:latest''')
+   docker run {q.client.image_name}''')
             ])
         
         q.page['docker'] = ui.form_card(
@@ -91,33 +102,44 @@ async def handle_file_upload(q: Q):
     """Handle file upload and dependency analysis."""
     if q.args.python_file:
         try:
+            uploaded_file = q.args.python_file[0]
+            file_hash = hashlib.sha256(uploaded_file.encode('utf-8')).hexdigest()
+
+            # Same upload as last time: reuse the saved file and its analysis
+            if (q.client.file_hash == file_hash and q.client.dependencies
+                    and q.client.temp_file_path and os.path.exists(q.client.temp_file_path)):
+                return
+
             with tempfile.NamedTemporaryFile(delete=False, suffix='.py') as temp_file:
-                uploaded_file = q.args.python_file[0]
-                
-                # Handle base64 encoded content
+                # Handle base64 encoded content, decoding straight into the temp file
                 if ',' in uploaded_file:
                     content = uploaded_file.split(',', 1)[1]
-                    decoded_content = base64.b64decode(content).decode('utf-8')
+                    write_base64(content, temp_file)
                 else:
-                    decoded_content = uploaded_file
+                    temp_file.write(uploaded_file.encode('utf-8'))
                 
-                temp_file.write(decoded_content.encode('utf-8'))
                 q.client.temp_file_path = temp_file.name
-                
-                # Analyze dependencies
-                dependencies = analyze_dependencies(temp_file.name)
-                if dependencies:
-                    q.client.dependencies = dependencies
-                else:
-                    q.client.dependencies = {
-                        "direct_imports": {},
-                        "package_requirements": {},
-                        "installed_versions": {}
-                    }
-                
-        except Exception as e:
+
+            # Analyze dependencies once the file is complete on disk
+            from dependency_cache import analyze_cached
+            dependencies = sorted(analyze_cached(temp_file.name), key=lambda dep: (dep.name, dep.version or ''))
+            packages = [dep for dep in dependencies if dep.type == 'package']
+            q.client.dependencies = {
+                "direct_imports": [dep.name for dep in dependencies],
+                "package_requirements": [f"{dep.name}=={dep.version}" if dep.version else dep.name for dep in packages],
+                "installed_versions": {dep.name: dep.version or "not installed" for dep in packages}
+            }
+            # Serialize once here rather than on every render
+            q.client.deps_json = {
+                key: json.dumps(value, indent=2) for key, value in q.client.dependencies.items()
+            }
+            q.client.file_hash = file_hash
+
+        except (OSError, ValueError, SyntaxError) as e:
             q.client.error = str(e)
             q.client.dependencies = None
+            q.client.deps_json = None
+            q.client.file_hash = None
 
 async def handle_docker_generation(q: Q):
     """Handle Docker image generation."""
@@ -128,26 +150,40 @@ async def handle_docker_generation(q: Q):
         if not hasattr(q.client, 'dependencies') or not q.client.dependencies:
             raise ValueError("No dependencies found. Please upload and analyze the file first.")
 
-        # Build Docker image with positional arguments instead of keyword arguments
-        builder = DockerImageBuilder(
-            q.client.dependencies['package_requirements'],
-            q.client.temp_file_path
-        )
-        output_path = builder.build_image()
+        from docker_builder import DockerBuilder, save_images
+        file_path = q.client.temp_file_path
 
-        if output_path and os.path.exists(output_path):
-            # Calculate image size
-            image_size = os.path.getsize(output_path) / (1024 * 1024)
-            
-            # Upload file to get download URL
-            download_url, = await q.site.upload([output_path])
-            
-            q.client.docker_output = f"Docker Image Generated Successfully!\nImage size: {image_size:.2f} MB"
-            q.client.docker_download_url = download_url
-        else:
+        def build_and_save():
+            with DockerBuilder(file_path) as builder:
+                image_name = builder.build()
+            if not image_name:
+                return None, None
+            output_path = os.path.join(tempfile.gettempdir(), f"{image_name.replace(':', '_')}.img")
+            return image_name, save_images([image_name], output_path)
+
+        # Build off the event loop so the UI stays responsive
+        image_name, output_path = await asyncio.to_thread(build_and_save)
+
+        # A single stat gives both existence and size
+        try:
+            image_size = os.stat(output_path).st_size / (1024 * 1024) if output_path else None
+        except FileNotFoundError:
+            image_size = None
+        if image_size is None:
             raise ValueError("Failed to generate Docker image output")
 
-    except Exception as e:
+        # Upload file to get download URL; the server keeps its own copy, so the
+        # full image is not left behind in the temp dir
+        try:
+            download_url, = await q.site.upload([output_path])
+        finally:
+            os.unlink(output_path)
+
+        q.client.docker_output = f"Docker Image Generated Successfully!\nImage size: {image_size:.2f} MB"
+        q.client.docker_download_url = download_url
+        q.client.image_name = image_name
+
+    except (OSError, ValueError) as e:
         print(f"Docker generation error: {str(e)}")  # Debug print
         q.client.error = f"Failed to build Docker image: {str(e)}"
 
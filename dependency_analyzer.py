@@ -1,24 +1,129 @@
-from dataclasses import dataclass
-from typing import List, Optional, Dict, Set
+from typing import List, NamedTuple, Optional, Dict, Set, Tuple, Union
 from pathlib import Path
+from importlib import metadata
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import functools
+import hashlib
+import io
 import os
+import sys
+import sysconfig
 import ast
 import re
 import subprocess
 import json
+import logging
 import tempfile
+import xml.etree.ElementTree as ET
+
+try:
+    from tomllib import loads as _toml_loads
+except ImportError:  # Python < 3.11
+    try:
+        from tomli import loads as _toml_loads
+    except ImportError:
+        try:
+            from toml import loads as _toml_loads
+        except ImportError:
+            _toml_loads = None
+
+logger = logging.getLogger(__name__)
 
-@dataclass
-class Dependency:
+class Dependency(NamedTuple):
     type: str  # 'package', 'module', 'class', 'function', 'crate', 'header'
     name: str  # Full name/path
     version: Optional[str] = None
     source: Optional[str] = None
-    dependencies: Set[str] = None
     language: str = ''  # 'python', 'java', 'javascript', 'cpp', 'go', 'rust'
 
-    def __hash__(self):
-        return hash((self.type, self.name, self.version, self.language))
+# Threads used to read and parse the files reachable from an analyzed file
+_ANALYSIS_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Requirement specifiers are split off package names with this
+_VERSION_SPLIT_RE = re.compile(r'[><=~]')
+
+# Each source language is scanned in one pass; alternatives are told apart by group name
+_JS_IMPORT_RE = re.compile(
+    r'(?:require|import)\s*\([\'"](?P<call>[^\'\"]+)[\'"]\)'
+    r'|(?:import|export).*?[\'"](?P<static>[^\'\"]+)[\'"]'
+)
+
+_JAVA_IMPORT_RE = re.compile(r'(?:package|import)\s+([\w.]+(?:\s*\*)?);')
+_GRADLE_DEP_RE = re.compile(r'implementation\s+[\'"]([^\'\"]+)[\'"]')
+
+_CPP_INCLUDE_RE = re.compile(r'#include\s*(?:<(?P<system>[^>]+)>|"(?P<local>[^"]+)")')
+_CMAKE_PACKAGE_RE = re.compile(r'find_package\s*\(\s*(\w+)(?:\s+(\d+(?:\.\d+)*))?\s*\)')
+
+_GO_IMPORT_RE = re.compile(r'import\s*(?:\((?P<block>.*?)\)|"(?P<single>[^"]+)")', re.DOTALL)
+
+_RUST_USE_RE = re.compile(r'use\s+((?:(?:crate|self|super)::)?\w+(?:::\w+)*)')
+
+# Import statements at the start of a line, and the module name in each imported item.
+# Strings and comments are matched too, only so that lines inside them are skipped
+_PY_IMPORT_RE = re.compile(r'''
+    "{3}(?:\\.|[^\\])*?"{3} | '{3}(?:\\.|[^\\])*?'{3}
+  | "(?:\\.|[^"\\\n])*" | '(?:\\.|[^'\\\n])*'
+  | \#[^\n]*
+  | ^[ \t]*(?:from[ \t]+(?P<from_module>[\w.]+)[ \t]+import\b|import[ \t]+(?P<import_names>[^\n#;]+))
+''', re.MULTILINE | re.VERBOSE)
+_PY_MODULE_NAME_RE = re.compile(r'\s*\.*([\w.]+)')
+
+# Statements whose nested bodies _analyze_python searches for imports
+_PYTHON_BLOCK_NODES = (
+    ast.If, ast.Try, ast.ExceptHandler, ast.With, ast.AsyncWith,
+    ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef
+) + ((ast.TryStar,) if hasattr(ast, 'TryStar') else ())
+_PYTHON_BLOCK_FIELDS = ('body', 'handlers', 'orelse', 'finalbody')
+
+def _list_stdlib_modules() -> frozenset:
+    """Top-level module names of the running interpreter's standard library"""
+    if hasattr(sys, 'stdlib_module_names'):
+        return frozenset(sys.stdlib_module_names)
+
+    # Python < 3.10: list the standard library directories instead
+    names = set(sys.builtin_module_names)
+    stdlib_dir = sysconfig.get_paths()['stdlib']
+    for directory in (stdlib_dir, os.path.join(stdlib_dir, 'lib-dynload')):
+        try:
+            entries = os.listdir(directory)
+        except OSError:
+            continue
+        for entry in entries:
+            name = entry.split('.')[0]
+            if name.isidentifier() and name != 'site-packages':
+                names.add(name)
+    return frozenset(names)
+
+_STDLIB_MODULES = _list_stdlib_modules()
+
+def _normalize_distribution_name(name: str) -> str:
+    """PEP 503 style key, so 'Foo.Bar' and 'foo-bar' match"""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+@functools.lru_cache(maxsize=None)
+def _installed_distributions() -> Tuple[Dict[str, List[str]], Dict[str, str]]:
+    """Import-name to distribution map and distribution versions, from one sweep of sys.path"""
+    import_map = metadata.packages_distributions() if hasattr(metadata, 'packages_distributions') else {}
+    versions = {}
+    for dist in metadata.distributions():
+        name = dist.metadata['Name']
+        if name:
+            # The first match on sys.path wins, as with metadata.version()
+            versions.setdefault(_normalize_distribution_name(name), dist.version)
+    return import_map, versions
+
+@functools.lru_cache(maxsize=None)
+def installed_packages_fingerprint() -> str:
+    """SHA-256 over every installed distribution and its version"""
+    _, versions = _installed_distributions()
+    return hashlib.sha256(json.dumps(sorted(versions.items())).encode()).hexdigest()
+
+@functools.lru_cache(maxsize=None)
+def _resolve_python_package(module_name: str) -> Tuple[str, Optional[str]]:
+    """Map a top-level import name to its installed distribution name and version"""
+    import_map, versions = _installed_distributions()
+    name = import_map.get(module_name, [module_name])[0]
+    return name, versions.get(_normalize_distribution_name(name))
 
 class DependencyAnalyzer:
     def __init__(self):
@@ -33,333 +138,458 @@ class DependencyAnalyzer:
             '.rs': self._analyze_rust
         }
         self.analyzed_paths = set()
+        # Local sources each analyzed file depends on, by absolute path
+        self.source_graph: Dict[str, List[str]] = {}
+        # Direct dependencies of each analyzed file, by absolute path
+        self._direct_dependencies: Dict[str, frozenset] = {}
         self.project_root = None
+        # Build manifest contents by path (None if absent), read once per analysis
+        self._manifest_cache: Dict[str, Optional[str]] = {}
+        # Entry names per directory, scanned once per analysis
+        self._dir_listing_cache: Dict[str, frozenset] = {}
+        # Every path whose existence the last analysis checked, present or not
+        self._probed_paths: Set[str] = set()
 
     def analyze(self, file_path: str) -> List[Dependency]:
         """Analyze file and all its dependencies recursively"""
+        return self.analyze_source(None, file_path)
+
+    def analyze_source(self, content: Optional[Union[str, bytes, memoryview]], file_path: str) -> List[Dependency]:
+        """Analyze already-loaded source of file_path and its dependencies recursively"""
         self.project_root = os.path.dirname(os.path.abspath(file_path))
         ext = Path(file_path).suffix
         
         if ext not in self.language_handlers:
             raise ValueError(f"Unsupported file type: {ext}")
 
-        dependencies = set()
-        self._analyze_file_recursive(file_path, dependencies)
-        return list(dependencies)
-
-    def _analyze_file_recursive(self, file_path: str, all_dependencies: Set[Dependency]) -> None:
-        """Recursively analyze a file and its dependencies"""
-        if file_path in self.analyzed_paths:
-            return
-        
-        self.analyzed_paths.add(file_path)
-        
+        if isinstance(content, (bytes, memoryview)):
+            content = str(content, 'utf-8')
+
+        # Files are read and parsed on worker threads; this thread merges results and
+        # schedules newly discovered sources. The workers share the manifest, listing and
+        # probed-path caches unlocked: each access is a single dict/set operation, atomic
+        # under the GIL, and a check-then-set race only reads the same file twice
+        self.analyzed_paths = {os.path.abspath(file_path)}
+        self.source_graph = {}
+        self._direct_dependencies = {}
+        self._manifest_cache = {}
+        self._dir_listing_cache = {}
+        self._probed_paths = set()
+        with ThreadPoolExecutor(max_workers=_ANALYSIS_WORKERS) as executor:
+            futures = {executor.submit(self._analyze_file, file_path, content): os.path.abspath(file_path)}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    direct_deps = future.result()
+                    path = futures.pop(future)
+                    self._direct_dependencies[path] = direct_deps
+                    edges = self.source_graph[path] = []
+                    for dep in direct_deps:
+                        if not dep.source:
+                            continue
+                        source = os.path.abspath(dep.source)
+                        edges.append(source)
+                        if self._should_follow(dep):
+                            self.analyzed_paths.add(source)
+                            follow = executor.submit(self._analyze_file, dep.source)
+                            futures[follow] = source
+                            pending.add(follow)
+        # Per-file sets are merged in one pass at the end
+        return list(set().union(*self._direct_dependencies.values()))
+
+    def _analyze_file(self, file_path: str, content: Optional[str] = None) -> frozenset:
+        """Analyze the direct dependencies of a single file"""
         try:
-            with open(file_path, 'r') as f:
-                content = f.read()
-
-            ext = Path(file_path).suffix
-            direct_deps = self.language_handlers[ext](content, file_path)
-            all_dependencies.update(direct_deps)
-
-            for dep in direct_deps:
-                self._analyze_dependency_recursive(dep, all_dependencies)
-
-        except Exception as e:
-            print(f"Error analyzing {file_path}: {str(e)}")
+            # Handlers return plain lists; duplicates are dropped here in one pass
+            handler = self.language_handlers.get(Path(file_path).suffix)
+            if handler is None:
+                logger.debug("No handler for %s, not analyzing it", file_path)
+                return frozenset()
+            if content is None:
+                with open(file_path, 'r') as f:
+                    content = f.read()
+            return frozenset(handler(content, file_path))
+
+        except (OSError, ValueError) as e:
+            logger.debug("Error analyzing %s: %s", file_path, e)
+            return frozenset()
+
+    def _dir_has(self, dirpath: str, name: str) -> bool:
+        """Whether dirpath has an entry called name, from one scandir per directory"""
+        self._probed_paths.add(os.path.join(dirpath, name))
+        listing = self._dir_listing_cache.get(dirpath)
+        if listing is None:
+            try:
+                with os.scandir(dirpath or '.') as entries:
+                    listing = frozenset(entry.name for entry in entries)
+            except OSError:
+                listing = frozenset()
+            self._dir_listing_cache[dirpath] = listing
+        return name in listing
+
+    def _path_exists(self, path: str) -> bool:
+        """os.path.exists answered from the cached listing of the parent directory"""
+        dirpath, name = os.path.split(os.path.normpath(path))
+        return self._dir_has(dirpath, name)
+
+    def _read_manifest(self, file_path: str, name: str) -> Optional[str]:
+        """Contents of the manifest called name next to file_path, or None if there is none"""
+        dirpath = os.path.dirname(file_path)
+        manifest_path = os.path.join(dirpath, name)
+        if manifest_path not in self._manifest_cache:
+            if not self._dir_has(dirpath, name):
+                self._manifest_cache[manifest_path] = None
+                return None
+            try:
+                with open(manifest_path) as f:
+                    self._manifest_cache[manifest_path] = f.read()
+            except FileNotFoundError:
+                self._manifest_cache[manifest_path] = None
+        return self._manifest_cache[manifest_path]
 
-    def _analyze_python(self, content: str, file_path: str) -> Set[Dependency]:
+    def _analyze_python(self, content: str, file_path: str) -> List[Dependency]:
         """Analyze Python dependencies"""
-        dependencies = set()
+        dependencies = []
         try:
-            tree = ast.parse(content)
-            
-            # Track imports
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for name in node.names:
-                        dep = self._get_python_package_info(name.name)
+            # Only setup scripts need the AST; plain imports are found with a line scan
+            if 'install_requires' in content:
+                dependencies.extend(self._analyze_python_ast(content, file_path))
+            else:
+                for match in _PY_IMPORT_RE.finditer(content):
+                    if match.lastgroup is None:
+                        continue
+                    from_module, import_names = match.group('from_module', 'import_names')
+                    for name in [from_module] if from_module else import_names.split(','):
+                        name_match = _PY_MODULE_NAME_RE.match(name)
+                        dep = name_match and self._get_python_package_info(name_match.group(1))
                         if dep:
-                            dependencies.add(dep)
-                            
-                elif isinstance(node, ast.ImportFrom):
-                    if node.module:
-                        dep = self._get_python_package_info(node.module)
-                        if dep:
-                            dependencies.add(dep)
-                            
-                # Check for pip requirements
-                elif isinstance(node, ast.Call):
-                    if isinstance(node.func, ast.Name) and node.func.id == 'install_requires':
-                        for arg in node.args:
-                            if isinstance(arg, ast.List):
-                                for elt in arg.elts:
-                                    if isinstance(elt, ast.Str):
-                                        pkg_name = re.split('[><=~]', elt.s)[0].strip()
-                                        dependencies.add(Dependency(
-                                            type='package',
-                                            name=pkg_name,
-                                            language='python'
-                                        ))
+                            dependencies.append(dep)
 
             # Check for requirements.txt
-            req_file = os.path.join(os.path.dirname(file_path), 'requirements.txt')
-            if os.path.exists(req_file):
-                with open(req_file) as f:
-                    for line in f:
-                        if line.strip() and not line.startswith('#'):
-                            pkg_name = re.split('[><=~]', line)[0].strip()
-                            dependencies.add(Dependency(
-                                type='package',
-                                name=pkg_name,
-                                language='python'
-                            ))
+            requirements = self._read_manifest(file_path, 'requirements.txt')
+            if requirements is not None:
+                for line in requirements.splitlines():
+                    if not (line := line.partition('#')[0].strip()):
+                        continue
+                    pkg_name = _VERSION_SPLIT_RE.split(line, 1)[0].strip()
+                    dependencies.append(Dependency(
+                        type='package',
+                        name=sys.intern(pkg_name),
+                        language='python'
+                    ))
                             
-        except Exception as e:
-            print(f"Error analyzing Python dependencies: {str(e)}")
+        except (SyntaxError, ValueError) as e:
+            logger.debug("Error analyzing Python dependencies in %s: %s", file_path, e)
             
         return dependencies
 
-    def _analyze_javascript(self, content: str, file_path: str) -> Set[Dependency]:
+    def _analyze_python_ast(self, content: str, file_path: str) -> List[Dependency]:
+        """Analyze Python imports and install_requires lists from the AST"""
+        dependencies = []
+        tree = ast.parse(content, filename=file_path, type_comments=False)
+        
+        # Track imports, descending only into statements that can contain them
+        stack = list(tree.body)
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ast.Import):
+                for name in node.names:
+                    dep = self._get_python_package_info(name.name)
+                    if dep:
+                        dependencies.append(dep)
+                        
+            elif isinstance(node, ast.ImportFrom):
+                if node.module:
+                    dep = self._get_python_package_info(node.module)
+                    if dep:
+                        dependencies.append(dep)
+                        
+            # Check for pip requirements
+            elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
+                call = node.value
+                if isinstance(call.func, ast.Name) and call.func.id == 'install_requires':
+                    for arg in call.args:
+                        if isinstance(arg, ast.List):
+                            for elt in arg.elts:
+                                if isinstance(elt, ast.Str):
+                                    pkg_name = _VERSION_SPLIT_RE.split(elt.s)[0].strip()
+                                    dependencies.append(Dependency(
+                                        type='package',
+                                        name=sys.intern(pkg_name),
+                                        language='python'
+                                    ))
+
+            elif isinstance(node, _PYTHON_BLOCK_NODES):
+                for field in _PYTHON_BLOCK_FIELDS:
+                    stack.extend(getattr(node, field, ()))
+
+        return dependencies
+
+    def _get_python_package_info(self, module_name: str) -> Optional[Dependency]:
+        """Resolve an imported module to a local module or an installed package"""
+        top_level = module_name.split('.')[0]
+        if not top_level or top_level in _STDLIB_MODULES:
+            return None
+
+        # Modules that live next to the analyzed file are followed as source
+        for candidate in (os.path.join(self.project_root, f"{top_level}.py"),
+                          os.path.join(self.project_root, top_level, '__init__.py')):
+            if self._path_exists(candidate):
+                return Dependency(
+                    type='module',
+                    name=sys.intern(module_name),
+                    source=candidate,
+                    language='python'
+                )
+
+        name, version = _resolve_python_package(top_level)
+        return Dependency(
+            type='package',
+            name=name,
+            version=version,
+            language='python'
+        )
+
+    def _analyze_javascript(self, content: str, file_path: str) -> List[Dependency]:
         """Analyze JavaScript dependencies"""
-        dependencies = set()
+        dependencies = []
         
         # Check for require/import statements
-        require_pattern = r'(?:require|import)\s*\([\'"]([^\'\"]+)[\'"]\)'
-        import_pattern = r'(?:import|export).*?[\'"]([^\'\"]+)[\'"]'
-        
-        for pattern in [require_pattern, import_pattern]:
-            for match in re.finditer(pattern, content):
-                dep_name = match.group(1)
-                dependencies.add(Dependency(
-                    type='module',
-                    name=dep_name,
-                    language='javascript'
-                ))
+        for match in _JS_IMPORT_RE.finditer(content):
+            dep_name = match.group(match.lastgroup)
+            dependencies.append(Dependency(
+                type='module',
+                name=sys.intern(dep_name),
+                language='javascript'
+            ))
 
         # Check package.json
-        package_json = os.path.join(os.path.dirname(file_path), 'package.json')
-        if os.path.exists(package_json):
-            with open(package_json) as f:
-                try:
-                    data = json.load(f)
-                    for dep_type in ['dependencies', 'devDependencies']:
-                        if dep_type in data:
-                            for name, version in data[dep_type].items():
-                                dependencies.add(Dependency(
-                                    type='package',
-                                    name=name,
-                                    version=version,
-                                    language='javascript'
-                                ))
-                except json.JSONDecodeError:
-                    pass
+        package_json = self._read_manifest(file_path, 'package.json')
+        if package_json is not None:
+            try:
+                data = json.loads(package_json)
+                for dep_type in ['dependencies', 'devDependencies']:
+                    if dep_type in data:
+                        for name, version in data[dep_type].items():
+                            dependencies.append(Dependency(
+                                type='package',
+                                name=sys.intern(name),
+                                version=version,
+                                language='javascript'
+                            ))
+            except (json.JSONDecodeError, AttributeError, TypeError) as e:
+                # Malformed JSON, or sections that are not name -> version objects
+                logger.debug("Error parsing package.json next to %s: %s", file_path, e)
 
         return dependencies
 
-    def _analyze_java(self, content: str, file_path: str) -> Set[Dependency]:
+    def _analyze_java(self, content: str, file_path: str) -> List[Dependency]:
         """Analyze Java dependencies"""
-        dependencies = set()
+        dependencies = []
         
-        # Check for imports
-        import_pattern = r'import\s+([\w.]+(?:\s*\*)?);'
-        package_pattern = r'package\s+([\w.]+);'
-        
-        # Get package dependencies
-        package_matches = re.finditer(package_pattern, content)
-        for match in package_matches:
-            dependencies.add(Dependency(
-                type='package',
-                name=match.group(1),
-                language='java'
-            ))
-
-        # Get import dependencies
-        import_matches = re.finditer(import_pattern, content)
+        # Get package and import dependencies
+        import_matches = _JAVA_IMPORT_RE.finditer(content)
         for match in import_matches:
             import_path = match.group(1)
-            dependencies.add(Dependency(
+            dependencies.append(Dependency(
                 type='package',
-                name=import_path,
+                name=sys.intern(import_path),
                 language='java'
             ))
 
         # Check build files for dependencies
-        build_gradle = os.path.join(os.path.dirname(file_path), 'build.gradle')
-        pom_xml = os.path.join(os.path.dirname(file_path), 'pom.xml')
+        build_gradle = self._read_manifest(file_path, 'build.gradle')
+        pom_xml = self._read_manifest(file_path, 'pom.xml') if build_gradle is None else None
         
-        if os.path.exists(build_gradle):
-            with open(build_gradle) as f:
-                gradle_content = f.read()
-                # Look for dependencies in build.gradle
-                dep_pattern = r'implementation\s+[\'"]([^\'\"]+)[\'"]'
-                for match in re.finditer(dep_pattern, gradle_content):
-                    dep_str = match.group(1)
-                    parts = dep_str.split(':')
-                    if len(parts) >= 2:
-                        dependencies.add(Dependency(
-                            type='package',
-                            name=f"{parts[0]}:{parts[1]}",
-                            version=parts[2] if len(parts) > 2 else None,
-                            language='java'
-                        ))
-
-        elif os.path.exists(pom_xml):
-            try:
-                import xml.etree.ElementTree as ET
-                tree = ET.parse(pom_xml)
-                root = tree.getroot()
-                
-                # Parse Maven dependencies
-                for dep in root.findall(".//dependency"):
-                    group_id = dep.find('groupId').text
-                    artifact_id = dep.find('artifactId').text
-                    version = dep.find('version').text if dep.find('version') is not None else None
-                    
-                    dependencies.add(Dependency(
+        if build_gradle is not None:
+            # Look for dependencies in build.gradle
+            for match in _GRADLE_DEP_RE.finditer(build_gradle):
+                dep_str = match.group(1)
+                parts = dep_str.split(':')
+                if len(parts) >= 2:
+                    dependencies.append(Dependency(
                         type='package',
-                        name=f"{group_id}:{artifact_id}",
-                        version=version,
+                        name=sys.intern(f"{parts[0]}:{parts[1]}"),
+                        version=parts[2] if len(parts) > 2 else None,
                         language='java'
                     ))
-            except Exception as e:
-                print(f"Error parsing pom.xml: {str(e)}")
+
+        elif pom_xml is not None:
+            try:
+                # Parse Maven dependencies as they stream past, discarding each one
+                # so the whole POM is never held as a tree
+                for _, elem in ET.iterparse(io.StringIO(pom_xml)):
+                    if elem.tag.rpartition('}')[2] != 'dependency':
+                        continue
+                    fields = {child.tag.rpartition('}')[2]: child.text for child in elem}
+                    elem.clear()
+                    if fields.get('groupId') and fields.get('artifactId'):
+                        dependencies.append(Dependency(
+                            type='package',
+                            name=sys.intern(f"{fields['groupId']}:{fields['artifactId']}"),
+                            version=fields.get('version'),
+                            language='java'
+                        ))
+            except ET.ParseError as e:
+                logger.debug("Error parsing pom.xml next to %s: %s", file_path, e)
 
         return dependencies
 
-    def _analyze_cpp(self, content: str, file_path: str) -> Set[Dependency]:
+    def _analyze_cpp(self, content: str, file_path: str) -> List[Dependency]:
         """Analyze C++ dependencies"""
-        dependencies = set()
-        
-        # Check for includes
-        system_include_pattern = r'#include\s*<([^>]+)>'
-        local_include_pattern = r'#include\s*"([^"]+)"'
+        dependencies = []
         
-        # System includes
-        for match in re.finditer(system_include_pattern, content):
-            dependencies.add(Dependency(
-                type='header',
-                name=match.group(1),
-                language='cpp'
-            ))
+        for match in _CPP_INCLUDE_RE.finditer(content):
+            # System includes
+            if match.lastgroup == 'system':
+                dependencies.append(Dependency(
+                    type='header',
+                    name=sys.intern(match.group('system')),
+                    language='cpp'
+                ))
+                continue
 
-        # Local includes
-        for match in re.finditer(local_include_pattern, content):
-            include_path = match.group(1)
+            # Local includes
+            include_path = match.group('local')
             full_path = os.path.join(os.path.dirname(file_path), include_path)
             
-            if os.path.exists(full_path):
-                dependencies.add(Dependency(
+            if self._path_exists(full_path):
+                dependencies.append(Dependency(
                     type='header',
-                    name=include_path,
+                    name=sys.intern(include_path),
                     source=full_path,
                     language='cpp'
                 ))
 
         # Check for CMakeLists.txt
-        cmake_file = os.path.join(os.path.dirname(file_path), 'CMakeLists.txt')
-        if os.path.exists(cmake_file):
-            with open(cmake_file) as f:
-                cmake_content = f.read()
-                # Look for find_package commands
-                package_pattern = r'find_package\s*\(\s*(\w+)(?:\s+(\d+(?:\.\d+)*))?\s*\)'
-                for match in re.finditer(package_pattern, cmake_content):
-                    dependencies.add(Dependency(
-                        type='package',
-                        name=match.group(1),
-                        version=match.group(2),
-                        language='cpp'
-                    ))
+        cmake_content = self._read_manifest(file_path, 'CMakeLists.txt')
+        if cmake_content is not None:
+            # Look for find_package commands
+            for match in _CMAKE_PACKAGE_RE.finditer(cmake_content):
+                dependencies.append(Dependency(
+                    type='package',
+                    name=sys.intern(match.group(1)),
+                    version=match.group(2),
+                    language='cpp'
+                ))
 
         return dependencies
 
-    def _analyze_go(self, content: str, file_path: str) -> Set[Dependency]:
+    def _analyze_go(self, content: str, file_path: str) -> List[Dependency]:
         """Analyze Go dependencies"""
-        dependencies = set()
-        
-        # Check for imports
-        import_block_pattern = r'import\s*\((.*?)\)'
-        single_import_pattern = r'import\s+"([^"]+)"'
+        dependencies = []
         
-        # Block imports
-        for match in re.finditer(import_block_pattern, content, re.DOTALL):
-            imports = match.group(1).strip().split('\n')
+        for match in _GO_IMPORT_RE.finditer(content):
+            # Single imports
+            if match.lastgroup == 'single':
+                dependencies.append(Dependency(
+                    type='package',
+                    name=sys.intern(match.group('single')),
+                    language='go'
+                ))
+                continue
+
+            # Block imports
+            imports = match.group('block').strip().split('\n')
             for imp in imports:
                 imp = imp.strip().strip('"')
                 if imp and not imp.startswith('//'):
-                    dependencies.add(Dependency(
+                    dependencies.append(Dependency(
                         type='package',
-                        name=imp,
+                        name=sys.intern(imp),
                         language='go'
                     ))
 
-        # Single imports
-        for match in re.finditer(single_import_pattern, content):
-            dependencies.add(Dependency(
-                type='package',
-                name=match.group(1),
-                language='go'
-            ))
-
         # Check go.mod file
-        go_mod = os.path.join(os.path.dirname(file_path), 'go.mod')
-        if os.path.exists(go_mod):
-            with open(go_mod) as f:
-                for line in f:
-                    if line.startswith('require '):
-                        parts = line.split()
-                        if len(parts) >= 2:
-                            dependencies.add(Dependency(
-                                type='package',
-                                name=parts[1],
-                                version=parts[2] if len(parts) > 2 else None,
-                                language='go'
-                            ))
+        go_mod = self._read_manifest(file_path, 'go.mod')
+        if go_mod is not None:
+            in_require_block = False
+            for line in go_mod.splitlines():
+                line = line.partition('//')[0].strip()
+                if in_require_block:
+                    if line == ')':
+                        in_require_block = False
+                        continue
+                    parts = line.split()
+                elif line.startswith('require ('):
+                    in_require_block = True
+                    continue
+                elif line.startswith('require '):
+                    parts = line.split()[1:]
+                else:
+                    continue
+
+                if parts:
+                    dependencies.append(Dependency(
+                        type='package',
+                        name=sys.intern(parts[0]),
+                        version=parts[1] if len(parts) > 1 else None,
+                        language='go'
+                    ))
 
         return dependencies
 
-    def _analyze_rust(self, content: str, file_path: str) -> Set[Dependency]:
+    def _analyze_rust(self, content: str, file_path: str) -> List[Dependency]:
         """Analyze Rust dependencies"""
-        dependencies = set()
+        dependencies = []
         
         # Check for use statements
-        use_pattern = r'use\s+((?:(?:crate|self|super)::)?\w+(?:::\w+)*)'
-        
-        for match in re.finditer(use_pattern, content):
-            dependencies.add(Dependency(
+        for match in _RUST_USE_RE.finditer(content):
+            dependencies.append(Dependency(
                 type='module',
-                name=match.group(1),
+                name=sys.intern(match.group(1)),
                 language='rust'
             ))
 
         # Check Cargo.toml for dependencies
-        cargo_toml = os.path.join(os.path.dirname(file_path), 'Cargo.toml')
-        if os.path.exists(cargo_toml):
+        cargo_toml = self._read_manifest(file_path, 'Cargo.toml')
+        if cargo_toml is not None and _toml_loads is None:
+            logger.warning("Skipping Cargo.toml next to %s: no TOML parser available, install tomli", file_path)
+        elif cargo_toml is not None:
             try:
-                import toml
-                with open(cargo_toml) as f:
-                    cargo_data = toml.load(f)
-                    
+                cargo_data = _toml_loads(cargo_toml)
+
                 for section in ['dependencies', 'dev-dependencies']:
                     if section in cargo_data:
                         for name, info in cargo_data[section].items():
                             version = info if isinstance(info, str) else info.get('version')
-                            dependencies.add(Dependency(
+                            dependencies.append(Dependency(
                                 type='crate',
-                                name=name,
+                                name=sys.intern(name),
                                 version=version,
                                 language='rust'
                             ))
-            except Exception as e:
-                print(f"Error parsing Cargo.toml: {str(e)}")
+            except (ValueError, AttributeError, TypeError) as e:
+                # Invalid TOML, or sections that are not name -> version tables
+                logger.debug("Error parsing Cargo.toml next to %s: %s", file_path, e)
 
         return dependencies
 
-    def _analyze_dependency_recursive(self, dep: Dependency, all_dependencies: Set[Dependency]) -> None:
-        """Recursively analyze a dependency's dependencies"""
+    def input_paths(self) -> List[str]:
+        """Source files, manifests and probed local paths the last analysis depended on"""
+        probed = {os.path.abspath(path) for path in self._probed_paths | set(self._manifest_cache)}
+        return sorted(self.analyzed_paths | probed)
+
+    def get_transitive(self, dep: Dependency) -> List[Dependency]:
+        """Dependencies reachable through dep's source, from the graph of the last analysis"""
         if not dep.source:
-            return
+            return []
+
+        start = os.path.abspath(dep.source)
+        seen = {start}
+        stack = [start]
+        while stack:
+            for source in self.source_graph.get(stack.pop(), ()):
+                if source not in seen:
+                    seen.add(source)
+                    stack.append(source)
+        return list(set().union(*(self._direct_dependencies.get(path, ()) for path in seen)))
+
+    def _should_follow(self, dep: Dependency) -> bool:
+        """Whether a dependency has source code that has not been analyzed yet"""
+        if not dep.source or Path(dep.source).suffix not in self.language_handlers:
+            return False
 
         # If we have source code, analyze it
-        if os.path.exists(dep.source):
-            self._analyze_file_recursive(dep.source, all_dependencies)
+        return os.path.abspath(dep.source) not in self.analyzed_paths and self._path_exists(dep.source)
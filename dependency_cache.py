@@ -0,0 +1,92 @@
+from typing import Dict, List, Optional, Tuple, Union
+from pathlib import Path
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from dependency_analyzer import DependencyAnalyzer, Dependency, installed_packages_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Pickled analysis results, one file per source content hash
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'airseal', 'deps')
+MEMORY_CACHE_SIZE = 256
+
+# (mtime_ns, size) per input path, None for inputs that did not exist
+Stamps = Dict[str, Optional[Tuple[int, int]]]
+
+# Latest result per source path, revalidated with stat() alone; shared by build threads
+_memory_cache: Dict[str, Tuple[Stamps, List[Dependency]]] = {}
+_memory_lock = threading.Lock()
+
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of path, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def _is_fresh(stamps: Stamps) -> bool:
+    """Whether none of the recorded inputs have changed since they were stamped"""
+    return all(_stamp(path) == stamp for path, stamp in stamps.items())
+
+def _load(cache_path: str) -> Optional[Tuple[Stamps, List[Dependency]]]:
+    """Read a cached result, or None if it is missing or unreadable"""
+    try:
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+        return None
+
+def _store(cache_path: str, entry: Tuple[Stamps, List[Dependency]]) -> None:
+    """Write a result atomically, so concurrent readers never see a partial file"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix='.tmp', delete=False) as tmp_file:
+            pickle.dump(entry, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file.name, cache_path)
+    except OSError as e:
+        logger.warning("Error writing dependency cache %s: %s", cache_path, e)
+
+def analyze_cached(file_path: str, source: Optional[Union[bytes, memoryview]] = None) -> List[Dependency]:
+    """Analyze file_path, reusing earlier results while none of its inputs have changed
+
+    source, when given, is the file's already-loaded contents and is used instead of reading it.
+    """
+    file_path = os.path.abspath(file_path)
+    with _memory_lock:
+        entry = _memory_cache.get(file_path)
+    if entry and _is_fresh(entry[0]):
+        return entry[1]
+
+    root_stamp = _stamp(file_path)
+    if source is None:
+        with open(file_path, 'rb') as f:
+            source = f.read()
+
+    # Local imports and manifests resolve against the file's directory, the handler
+    # is picked by extension, and package versions come from the installed
+    # environment, so all three are part of the key
+    key = hashlib.sha256(
+        f"{os.path.dirname(file_path)}\0{Path(file_path).suffix}\0{installed_packages_fingerprint()}\0".encode()
+    )
+    key.update(source)
+    cache_path = os.path.join(CACHE_DIR, f"{key.hexdigest()}.pkl")
+
+    entry = _load(cache_path)
+    if entry is None or not _is_fresh(entry[0]):
+        analyzer = DependencyAnalyzer()
+        dependencies = analyzer.analyze_source(source, file_path)
+        # The file itself is covered by the content hash
+        entry = ({path: _stamp(path) for path in analyzer.input_paths() if path != file_path}, dependencies)
+        _store(cache_path, entry)
+
+    stamps, dependencies = entry
+    with _memory_lock:
+        if len(_memory_cache) >= MEMORY_CACHE_SIZE:
+            _memory_cache.pop(next(iter(_memory_cache)))
+        _memory_cache[file_path] = ({**stamps, file_path: root_stamp}, dependencies)
+    return dependencies
@@ -1,16 +1,81 @@
-from typing import Optional, Dict
+from typing import Optional, Dict, List
+import hashlib
+import json
 import os
+import re
+import shutil
 import tempfile
 import subprocess
+import threading
+import weakref
 from pathlib import Path
-from dependency_analyzer import DependencyAnalyzer, Dependency
+from concurrent.futures import ThreadPoolExecutor
+import docker
+from docker.errors import DockerException
+from dependency_analyzer import Dependency
+from dependency_cache import analyze_cached
+
+_JAVA_CLASS_RE = re.compile(r'public\s+class\s+(\w+)')
+
+# Kept out of every build context, so stray artifacts neither bloat it nor bust the cache
+_DOCKERIGNORE = "**/__pycache__\n*.pyc\n*.pyo\n.git\n.venv\nnode_modules\ntarget\nbuild\n"
+
+# Build contexts go on tmpfs when the source already lives there and it has room, so
+# docker reads them from memory. Anywhere else a link into tmpfs would fail across
+# filesystems and copy the source into RAM, and containers only get a 64 MiB /dev/shm
+_SHM_DIR = '/dev/shm'
+_SHM_HEADROOM = 1 << 20  # generated manifests, Dockerfile and .dockerignore
+
+def _in_manifest_order(dependencies: List[Dependency]) -> List[Dependency]:
+    """Dependencies in a fixed order, so the same inputs always generate byte-identical manifests"""
+    return sorted(dependencies, key=lambda dep: (dep.name, dep.version or ''))
+
+def _build_dir_root(src: str) -> Optional[str]:
+    """Directory to create the build context for src in; None means tempfile.gettempdir()"""
+    try:
+        if os.stat(src).st_dev != os.stat(_SHM_DIR).st_dev:
+            return None
+        shm = os.statvfs(_SHM_DIR)
+        needed = os.path.getsize(src) + _SHM_HEADROOM
+    except OSError:
+        return None
+    if shm.f_bavail * shm.f_frsize < needed or not os.access(_SHM_DIR, os.W_OK):
+        return None
+    return _SHM_DIR
+
+def _stage_source(src: str, dst: str) -> None:
+    """Place src in the build context, hard-linking when possible instead of copying"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Different filesystem or no link support: copyfile uses the kernel's copy fast path
+        shutil.copyfile(src, dst)
 
 class DockerBuilder:
+    # One SDK client shared by every builder, connected on first use
+    _client: Optional[docker.DockerClient] = None
+    _client_lock = threading.Lock()
+
     def __init__(self, file_path: str):
         self.file_path = file_path
-        self.temp_dir = tempfile.mkdtemp()
-        self.dependency_analyzer = DependencyAnalyzer()
-        
+        self.temp_dir = tempfile.mkdtemp(prefix='airseal-', dir=_build_dir_root(file_path))
+        # Removes the build context even if cleanup() is never called
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.temp_dir, True)
+
+    def __enter__(self) -> 'DockerBuilder':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.cleanup()
+
+    @property
+    def client(self) -> docker.DockerClient:
+        """Docker SDK client shared across builders"""
+        with DockerBuilder._client_lock:
+            if DockerBuilder._client is None:
+                DockerBuilder._client = docker.from_env()
+        return DockerBuilder._client
+
     def build(self) -> Optional[str]:
         """Build Docker image based on file type"""
         ext = Path(self.file_path).suffix
@@ -30,13 +95,15 @@ class DockerBuilder:
             
         return builders[ext]()
 
-    def _generate_dockerfile(self, base_image: str, deps_commands: list, build_commands: list, run_command: str) -> str:
+    def _generate_dockerfile(self, base_image: str, deps_commands: list, source_commands: list, build_commands: list, run_command: str) -> str:
         """Generate Dockerfile content"""
-        return f"""
+        # The syntax directive must be the very first line to enable RUN --mount and COPY --link.
+        # Sources are copied after the dependency install, so editing them keeps that layer cached
+        return f"""# syntax=docker/dockerfile:1.4
 FROM {base_image}
 WORKDIR /app
 {chr(10).join(deps_commands)}
-COPY . .
+{chr(10).join(source_commands)}
 {chr(10).join(build_commands)}
 CMD {run_command}
 """
@@ -45,29 +112,30 @@ CMD {run_command}
         """Build Python Docker image"""
         try:
             # Analyze dependencies
-            dependencies = self.dependency_analyzer.analyze(self.file_path)
+            dependencies = analyze_cached(self.file_path)
             
             # Generate requirements.txt
             requirements_path = os.path.join(self.temp_dir, 'requirements.txt')
             with open(requirements_path, 'w') as f:
-                for dep in dependencies:
+                for dep in _in_manifest_order(dependencies):
                     if dep.type == 'package':
                         f.write(f"{dep.name}{f'=={dep.version}' if dep.version else ''}\n")
 
-            # Copy source file
-            dest_path = os.path.join(self.temp_dir, os.path.basename(self.file_path))
-            with open(self.file_path, 'rb') as src, open(dest_path, 'wb') as dst:
-                dst.write(src.read())
+            # Staged under a fixed name, so the build context depends only on content
+            _stage_source(self.file_path, os.path.join(self.temp_dir, 'main.py'))
 
             # Generate Dockerfile
             dockerfile = self._generate_dockerfile(
                 base_image="python:3.9-slim",
                 deps_commands=[
-                    "COPY requirements.txt .",
-                    "RUN pip install --no-cache-dir -r requirements.txt"
+                    "COPY --link requirements.txt .",
+                    "RUN --mount=type=cache,target=/root/.cache/pip,sharing=locked pip install -r requirements.txt"
+                ],
+                source_commands=[
+                    "COPY --link main.py ."
                 ],
                 build_commands=[],
-                run_command=f'["python", "{os.path.basename(self.file_path)}"]'
+                run_command='["python", "main.py"]'
             )
 
             return self._build_from_dockerfile(dockerfile)
@@ -85,21 +153,21 @@ CMD {run_command}
             with open(self.file_path, 'r') as f:
                 content = f.read()
                 # Find public class name
-                import re
-                class_match = re.search(r'public\s+class\s+(\w+)', content)
+                class_match = _JAVA_CLASS_RE.search(content)
                 if class_match:
                     class_name = class_match.group(1)
                     # Rename file to match class name
                     filename = f"{class_name}.java"
 
-            dest_path = os.path.join(self.temp_dir, filename)
-            with open(self.file_path, 'rb') as src, open(dest_path, 'wb') as dst:
-                dst.write(src.read())
+            _stage_source(self.file_path, os.path.join(self.temp_dir, filename))
 
             base_name = os.path.splitext(filename)[0]
             dockerfile = self._generate_dockerfile(
                 base_image="openjdk:11-jdk-slim",
                 deps_commands=[],
+                source_commands=[
+                    f"COPY --link {filename} ."
+                ],
                 build_commands=[
                     f"RUN mkdir -p build && \\\n"
                     f"    javac -d build {filename} || echo 'Compilation failed' && \\\n"
@@ -117,7 +185,7 @@ CMD {run_command}
     def _build_node_image(self) -> Optional[str]:
         """Build Node.js Docker image"""
         try:
-            dependencies = self.dependency_analyzer.analyze(self.file_path)
+            dependencies = analyze_cached(self.file_path)
             
             # Generate package.json
             package_json = {
@@ -126,21 +194,27 @@ CMD {run_command}
                 "dependencies": {}
             }
             
-            for dep in dependencies:
+            for dep in _in_manifest_order(dependencies):
                 if dep.type == 'package':
                     package_json["dependencies"][dep.name] = dep.version or "latest"
 
             with open(os.path.join(self.temp_dir, 'package.json'), 'w') as f:
                 json.dump(package_json, f, indent=2)
 
+            # Staged under a fixed name, so the build context depends only on content
+            _stage_source(self.file_path, os.path.join(self.temp_dir, 'index.js'))
+
             dockerfile = self._generate_dockerfile(
                 base_image="node:16-slim",
                 deps_commands=[
-                    "COPY package.json .",
+                    "COPY --link package.json .",
                     "RUN npm install"
                 ],
+                source_commands=[
+                    "COPY --link index.js ."
+                ],
                 build_commands=[],
-                run_command=f'["node", "{os.path.basename(self.file_path)}"]'
+                run_command='["node", "index.js"]'
             )
 
             return self._build_from_dockerfile(dockerfile)
@@ -152,7 +226,7 @@ CMD {run_command}
     def _build_cpp_image(self) -> Optional[str]:
         """Build C++ Docker image"""
         try:
-            dependencies = self.dependency_analyzer.analyze(self.file_path)
+            dependencies = analyze_cached(self.file_path)
             
             # Generate CMakeLists.txt
             cmake_content = f"""
@@ -161,22 +235,28 @@ project(app)
 
 set(CMAKE_CXX_STANDARD 17)
 """
-            for dep in dependencies:
+            for dep in _in_manifest_order(dependencies):
                 if dep.type == 'package':
                     cmake_content += f"\nfind_package({dep.name} REQUIRED)"
 
-            cmake_content += f"""
-add_executable(app {os.path.basename(self.file_path)})
+            cmake_content += """
+add_executable(app main.cpp)
 """
 
             with open(os.path.join(self.temp_dir, 'CMakeLists.txt'), 'w') as f:
                 f.write(cmake_content)
 
+            # Staged under a fixed name, so the build context depends only on content
+            _stage_source(self.file_path, os.path.join(self.temp_dir, 'main.cpp'))
+
             dockerfile = self._generate_dockerfile(
                 base_image="gcc:latest",
                 deps_commands=[
                     "RUN apt-get update && apt-get install -y cmake"
                 ],
+                source_commands=[
+                    "COPY --link CMakeLists.txt main.cpp ./"
+                ],
                 build_commands=[
                     "RUN cmake . && make"
                 ],
@@ -192,13 +272,13 @@ add_executable(app {os.path.basename(self.file_path)})
     def _build_go_image(self) -> Optional[str]:
         """Build Go Docker image"""
         try:
-            dependencies = self.dependency_analyzer.analyze(self.file_path)
+            dependencies = analyze_cached(self.file_path)
             
             # Generate go.mod
             module_name = "app"
             go_mod_content = f"module {module_name}\n\ngo 1.16\n\nrequire (\n"
             
-            for dep in dependencies:
+            for dep in _in_manifest_order(dependencies):
                 if dep.type == 'package':
                     version = dep.version or "latest"
                     go_mod_content += f"\t{dep.name} {version}\n"
@@ -208,12 +288,18 @@ add_executable(app {os.path.basename(self.file_path)})
             with open(os.path.join(self.temp_dir, 'go.mod'), 'w') as f:
                 f.write(go_mod_content)
 
+            # Staged under a fixed name, so the build context depends only on content
+            _stage_source(self.file_path, os.path.join(self.temp_dir, 'main.go'))
+
             dockerfile = self._generate_dockerfile(
                 base_image="golang:1.16",
                 deps_commands=[
-                    "COPY go.mod .",
+                    "COPY --link go.mod .",
                     "RUN go mod download"
                 ],
+                source_commands=[
+                    "COPY --link main.go ."
+                ],
                 build_commands=[
                     "RUN go build -o app"
                 ],
@@ -229,38 +315,37 @@ add_executable(app {os.path.basename(self.file_path)})
     def _build_rust_image(self) -> Optional[str]:
         """Build Rust Docker image"""
         try:
-            dependencies = self.dependency_analyzer.analyze(self.file_path)
+            dependencies = analyze_cached(self.file_path)
             
-            # Generate Cargo.toml
-            cargo_toml = {
-                "package": {
-                    "name": "app",
-                    "version": "0.1.0",
-                    "edition": "2021"
-                },
-                "dependencies": {}
-            }
-            
-            for dep in dependencies:
+            # Generate Cargo.toml; JSON string escapes are valid TOML basic strings
+            cargo_toml = '[package]\nname = "app"\nversion = "0.1.0"\nedition = "2021"\n\n[dependencies]\n'
+            for dep in _in_manifest_order(dependencies):
                 if dep.type == 'crate':
-                    cargo_toml["dependencies"][dep.name] = dep.version or "*"
+                    cargo_toml += f"{json.dumps(dep.name)} = {json.dumps(dep.version or '*')}\n"
 
             with open(os.path.join(self.temp_dir, 'Cargo.toml'), 'w') as f:
-                import toml
-                toml.dump(cargo_toml, f)
+                f.write(cargo_toml)
+
+            # Cargo expects the binary's entry point at src/main.rs
+            os.makedirs(os.path.join(self.temp_dir, 'src'))
+            _stage_source(self.file_path, os.path.join(self.temp_dir, 'src', 'main.rs'))
 
             dockerfile = self._generate_dockerfile(
                 base_image="rust:1.60",
                 deps_commands=[
-                    "COPY Cargo.toml .",
-                    "RUN mkdir src && echo 'fn main() {}' > src/main.rs",
-                    "RUN cargo build --release",
-                    "RUN rm -rf src"
+                    "COPY --link Cargo.toml ."
+                ],
+                source_commands=[
+                    "COPY --link src ./src"
                 ],
                 build_commands=[
-                    "RUN cargo build --release"
+                    # Crate downloads and compiled artifacts persist across builds in cache
+                    # mounts, so the binary is copied out of target/ before it is unmounted
+                    "RUN --mount=type=cache,target=/usr/local/cargo/registry \\\n"
+                    "    --mount=type=cache,target=/app/target \\\n"
+                    "    cargo build --release && cp target/release/app /app/app"
                 ],
-                run_command='["./target/release/app"]'
+                run_command='["./app"]'
             )
 
             return self._build_from_dockerfile(dockerfile)
@@ -276,10 +361,25 @@ add_executable(app {os.path.basename(self.file_path)})
             dockerfile_path = os.path.join(self.temp_dir, 'Dockerfile')
             with open(dockerfile_path, 'w') as f:
                 f.write(dockerfile_content)
-
-            # Build Docker image
-            image_name = f"airseal-app:{os.path.basename(self.file_path)}"
-            subprocess.run(['docker', 'build', '-t', image_name, self.temp_dir], check=True)
+            with open(os.path.join(self.temp_dir, '.dockerignore'), 'w') as f:
+                f.write(_DOCKERIGNORE)
+
+            # Tag by build context, so identical inputs map to an image we already have
+            image_name = f"airseal-app:{self._context_digest()[:16]}"
+            if self._image_exists(image_name):
+                return image_name
+
+            # Build with BuildKit, seeding the layer cache from the last image built
+            # for this language so unchanged dependency layers are reused
+            cache_image = f"airseal-cache:{Path(self.file_path).suffix.lstrip('.')}"
+            subprocess.run([
+                'docker', 'build',
+                '--cache-from', cache_image,
+                '--build-arg', 'BUILDKIT_INLINE_CACHE=1',
+                '-t', image_name,
+                '-t', cache_image,
+                self.temp_dir
+            ], env={**os.environ, 'DOCKER_BUILDKIT': '1'}, check=True)
             return image_name
 
         except subprocess.CalledProcessError as e:
@@ -289,10 +389,46 @@ add_executable(app {os.path.basename(self.file_path)})
             print(f"Error building Docker image: {str(e)}")
             return None
 
+    def _context_digest(self) -> str:
+        """SHA-256 over the names and contents of every file in the build context"""
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(self.temp_dir):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update(f"{os.path.relpath(path, self.temp_dir)}\0{os.path.getsize(path)}\0".encode())
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(chunk)
+        return digest.hexdigest()
+
+    def _image_exists(self, image_name: str) -> bool:
+        """Whether the daemon already has image_name; if it cannot be asked, build anyway"""
+        try:
+            self.client.images.get(image_name)
+            return True
+        except DockerException:
+            return False
+
     def cleanup(self):
         """Clean up temporary directory"""
-        try:
-            import shutil
-            shutil.rmtree(self.temp_dir)
-        except Exception as e:
-            print(f"Error cleaning up: {str(e)}")
+        self._finalizer()
+
+def build_many(file_paths: List[str], max_workers: Optional[int] = None) -> List[Optional[str]]:
+    """Build images for several files concurrently, returning image names in input order"""
+    def build_one(file_path: str) -> Optional[str]:
+        with DockerBuilder(file_path) as builder:
+            return builder.build()
+
+    # Each build waits on a docker subprocess, so threads are enough
+    with ThreadPoolExecutor(max_workers=max_workers or min(8, os.cpu_count() or 1)) as executor:
+        return list(executor.map(build_one, file_paths))
+
+def save_images(image_names: List[str], output_path: str) -> Optional[str]:
+    """Save several images into one tarball, so layers they share are written once"""
+    try:
+        subprocess.run(['docker', 'save', '-o', output_path, *image_names], check=True)
+        return output_path
+    except subprocess.CalledProcessError as e:
+        print(f"Docker save failed: {str(e)}")
+        return None